@@ -0,0 +1,252 @@
+# Reproducible benchmarks for the task engine (and the GUI list when a display is available).
+#
+#   python benchmarks.py                          # 1k and 100k tasks
+#   python benchmarks.py --sizes 1000 100000 1000000 --output bench.json
+#   python benchmarks.py --compare bench.json     # show the change against an earlier run
+#
+# Each benchmark reports wall time and peak Python memory (tracemalloc, measured in a second
+# run so tracing does not distort the timing). Synthetic tasks are generated from --seed, so
+# two runs with the same arguments work on identical data.
+import argparse
+import json
+import os
+import platform
+import random
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from datetime import date, datetime, timedelta
+
+from task_engine import (OPENPYXL_AVAILABLE, BinaryTaskReader, BulkImport, CsvImport, SearchIndex, TaskEngine, TaskExport, TaskFile,
+                         TaskJournal, TaskModel, load_tasks, save_tasks)
+
+SORT_MODES = [
+    "ID (Ascending)", "ID (Descending)",
+    "Alphabetical (A-Z)", "Alphabetical (Z-A)",
+    "Completed First", "Not Completed First",
+    "Due Date (Sooner First)", "Due Date (Latest First)",
+]
+WORDS = ["buy", "milk", "call", "mom", "fix", "bug", "write", "report", "review", "pull request",
+         "book", "flight", "pay", "rent", "clean", "kitchen", "plan", "sprint", "email", "team",
+         "renew", "passport", "water", "plants", "update", "resume", "gym", "dentist", "groceries"]
+SEARCH_TYPING = ["r", "re", "rep", "repo", "repor", "report"]  # one query per keystroke
+
+# Synthetic tasks: due dates cluster around today (a few months back, more ahead), ~10% have
+# no due date, and past tasks are much more likely to be completed than future ones.
+def make_tasks(n, seed=0, today=None):
+    rng = random.Random(seed)
+    today = today or date.today()
+    tasks = []
+    for i in range(1, n + 1):
+        text = " ".join(rng.choice(WORDS) for _ in range(rng.randint(2, 6))).capitalize()
+        if rng.random() < 0.1:
+            due, past = "No due date", rng.random() < 0.5
+        else:
+            offset = int(rng.triangular(-90, 180, 7))
+            due, past = (today + timedelta(days=offset)).strftime("%Y-%m-%d"), offset < 0
+        completed = rng.random() < (0.75 if past else 0.15)
+        tasks.append({"id": i, "task": text, "completed": completed, "due_date": due})
+    return tasks
+
+def write_csv(path, tasks):
+    import csv
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(["id", "task", "completed", "due_date"])
+        for t in tasks:
+            writer.writerow([t["id"], t["task"], t["completed"], t["due_date"]])
+
+def engine_for(tasks, workdir):
+    engine = TaskEngine(TaskJournal(os.path.join(tempfile.mkdtemp(dir=workdir), "tasks.json")))
+    model = TaskModel(dict(t) for t in tasks)
+    engine.store.commit(model, put=model)
+    engine.load()
+    return engine
+
+# Each case returns (setup, run): setup() prepares fresh state outside the timed region and
+# returns the argument for run(). Everything is written under workdir, which the caller removes.
+def cases(tasks, workdir, seed=0):
+    json_path = os.path.join(workdir, "tasks.json")
+    bin_path = os.path.join(workdir, "tasks.bin")
+    csv_path = os.path.join(workdir, "tasks.csv")
+    save_tasks(tasks, json_path, fmt="json")
+    save_tasks(tasks, bin_path, fmt="binary")
+    write_csv(csv_path, tasks)
+    # the same tasks split over four files for the parallel bulk import
+    parts_dir = os.path.join(workdir, "parts")
+    os.makedirs(parts_dir, exist_ok=True)
+    for i in range(4):
+        write_csv(os.path.join(parts_dir, f"part{i}.csv"), tasks[i::4])
+    engine = engine_for(tasks, workdir)
+
+    def run_import(target):
+        job = CsvImport(csv_path)
+        job.start()
+        while not job.finished:
+            job.apply_next(target, timeout=0.1)
+
+    def run_bulk_import(target):
+        job = BulkImport([parts_dir])
+        job.start()
+        while not job.finished:
+            job.apply_next(target, timeout=0.1)
+
+    def run_export(path):
+        job = TaskExport(tasks, path)
+        job.run()
+        if job.error is not None:
+            raise job.error
+
+    def fresh_engine():
+        e = TaskEngine(TaskJournal(os.path.join(tempfile.mkdtemp(dir=workdir), "tasks.json")))
+        e.load()
+        return e
+
+    def search(e):
+        for q in SEARCH_TYPING:
+            e.query(q)
+
+    # the query cases measure the computation, not a query cache hit
+    def uncached():
+        engine.query_cache.clear()
+        return engine
+
+    def cached():
+        engine.query("", "All", "Due Date (Sooner First)")
+        return engine
+
+    # a list already in sync with a local server, then a few edits: the sync sends only those
+    synced = {}
+    rng = random.Random(seed)
+    def sync_edits():
+        if not synced:
+            from task_sync import SyncClient, make_server
+            server = make_server(os.path.join(workdir, "sync.db"), port=0)
+            threading.Thread(target=server.serve_forever, daemon=True).start()
+            synced["engine"] = engine_for(tasks, workdir)
+            synced["client"] = SyncClient(f"http://127.0.0.1:{server.server_address[1]}", os.path.join(workdir, "sync.json"))
+            synced["client"].sync(synced["engine"])
+        for task in rng.sample(list(synced["engine"].model), min(10, len(tasks))):
+            synced["engine"].toggle(task)
+        return synced["engine"], synced["client"]
+
+    for fmt, path in (("json", json_path), ("binary", bin_path)):
+        yield f"load_tasks[{fmt}]", lambda path=path: path, load_tasks
+        yield f"save_tasks[{fmt}]", lambda: list(tasks), lambda ts, fmt=fmt: save_tasks(ts, os.path.join(workdir, "saved"), fmt=fmt)
+    yield "first_page[binary]", lambda: bin_path, first_page
+    yield "journal_load", lambda: TaskJournal(json_path), lambda store: store.load()
+    yield "file_commit_one", lambda: (TaskFile(os.path.join(workdir, "file.json")), TaskModel(tasks)), \
+        lambda a: a[0].commit(a[1], put=[tasks[0]])
+    yield "journal_commit_one", lambda: TaskJournal(os.path.join(workdir, "journal.json")), \
+        lambda store: store.commit(engine.model, put=[tasks[0]])
+    yield "allocate_ids", lambda: TaskModel(tasks), lambda m: [m.allocate_id() for _ in range(len(tasks))]
+    yield "engine_load", lambda: TaskEngine(TaskFile(json_path)), lambda e: e.load()
+    for mode in SORT_MODES:
+        yield f"sort[{mode}]", uncached, lambda e, mode=mode: e.query("", "All", mode)
+    yield "filter[Completed]", uncached, lambda e: e.query("", "Completed")
+    yield "live_search", uncached, search
+    # peak memory is the point here: the trigram postings of every task
+    yield "search_index_build", lambda: list(engine.model), SearchIndex
+    yield "query[cached]", cached, lambda e: e.query("", "All", "Due Date (Sooner First)")
+    yield "calendar_month", lambda: engine, lambda e: e.day_counts(date.today().toordinal() - 7, date.today().toordinal() + 45)
+    yield "import_csv", fresh_engine, run_import
+    yield "bulk_import[4 files]", fresh_engine, run_bulk_import
+    yield "sync[10 edits]", sync_edits, lambda a: a[1].sync(a[0])
+    yield "export_csv", lambda: os.path.join(workdir, "out.csv"), run_export
+    yield "export_csv_gz", lambda: os.path.join(workdir, "out.csv.gz"), run_export
+    if OPENPYXL_AVAILABLE:
+        yield "export_excel", lambda: os.path.join(workdir, "out.xlsx"), run_export
+    if os.environ.get("DISPLAY") or sys.platform in ("win32", "darwin"):
+        yield "refresh_list", lambda: gui_app(engine, workdir), gui_refresh
+
+# what the GUI shows before the load finishes: one screen of rows from the mapped file
+def first_page(path):
+    with BinaryTaskReader(path) as reader:
+        return [reader[i] for i in range(min(20, len(reader)))]
+
+# refresh_list needs a Tk display (e.g. run under xvfb-run); the app gets the prepared engine
+# (its own data file is opened in workdir, never the tasks.json of the working directory)
+def gui_app(engine, workdir):
+    import importlib.util
+    spec = importlib.util.spec_from_file_location("todo_gui", os.path.join(os.path.dirname(os.path.abspath(__file__)), "to-do_List.py"))
+    gui = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(gui)
+    app = gui.TaskManagerApp(data_path=os.path.join(workdir, "gui.json"))
+    app.engine = engine
+    app.loaded = True
+    app.update()
+    return app
+
+def gui_refresh(app):
+    results = app.engine.query("", "All", "Due Date (Sooner First)")
+    app.show_results(results)
+    app.update_idletasks()
+    app.destroy()
+
+def measure(setup, run, memory=True):
+    arg = setup()
+    start = time.perf_counter()
+    run(arg)
+    seconds = time.perf_counter() - start
+    peak = None
+    if memory:
+        arg = setup()
+        tracemalloc.start()
+        run(arg)
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+    return seconds, peak
+
+def compare(results, previous_path):
+    with open(previous_path, "r", encoding="utf-8") as f:
+        previous = {(r["name"], r["size"]): r for r in json.load(f)["results"]}
+    print(f"\n{'benchmark':40} {'size':>9} {'before':>10} {'now':>10} {'change':>8}")
+    for r in results:
+        old = previous.get((r["name"], r["size"]))
+        if old:
+            change = (r["seconds"] / old["seconds"] - 1) * 100 if old["seconds"] else 0.0
+            print(f"{r['name']:40} {r['size']:>9} {old['seconds']:>9.4f}s {r['seconds']:>9.4f}s {change:>+7.1f}%")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark load/save/sort/search/import/export at scale.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 100000])
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--only", nargs="+", default=None, help="run only benchmarks whose name starts with one of these")
+    parser.add_argument("--no-memory", action="store_true", help="skip the tracemalloc peak-memory pass")
+    parser.add_argument("--output", default=None, help="write results as JSON")
+    parser.add_argument("--compare", default=None, help="earlier JSON results to compare against")
+    args = parser.parse_args(argv)
+
+    results = []
+    for size in args.sizes:
+        tasks = make_tasks(size, args.seed)
+        with tempfile.TemporaryDirectory() as workdir:
+            for name, setup, run in cases(tasks, workdir, args.seed):
+                if args.only and not name.startswith(tuple(args.only)):
+                    continue
+                seconds, peak = measure(setup, run, memory=not args.no_memory)
+                results.append({"name": name, "size": size, "seconds": seconds, "peak_bytes": peak})
+                mem = f"{peak / 2**20:9.1f} MiB" if peak is not None else ""
+                print(f"{name:40} {size:>9} {seconds:>10.4f}s {mem}", flush=True)
+
+    report = {
+        "meta": {
+            "timestamp": datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "seed": args.seed,
+            "sizes": args.sizes,
+        },
+        "results": results,
+    }
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=4)
+    if args.compare:
+        compare(results, args.compare)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,168 @@
+# Low-overhead instrumentation shared by the engine, the GUI and the CLI.
+#
+#   with span("query.sort"): ...          # latency histogram, plus a trace event while tracing
+#   count("import.rows", len(rows))       # counters
+#   start_tracing(); ...; dump_trace("trace.json")   # Chrome trace-event JSON (chrome://tracing, Perfetto)
+#
+# Histograms use power-of-two microsecond buckets, so recording a span is a clock read and a
+# few integer operations. Trace events are only kept while tracing is on (TODO_TRACE=path
+# turns it on at startup and writes the trace at exit), in a ring buffer of TRACE_LIMIT events.
+import atexit
+import functools
+import json
+import os
+import threading
+import time
+from collections import defaultdict, deque
+
+TRACE_LIMIT = 200000  # newest trace events kept in memory
+TRACE_PATH = os.environ.get("TODO_TRACE")  # record a trace for the whole run and write it here at exit
+HISTOGRAM_BUCKETS = 40  # bucket i counts spans shorter than 2**i microseconds
+
+class Histogram:
+    def __init__(self):
+        self.buckets = [0] * HISTOGRAM_BUCKETS
+        self.count = 0
+        self.total = 0  # nanoseconds
+        self.max = 0
+        self.last = 0
+
+    def record(self, ns):
+        self.count += 1
+        self.total += ns
+        self.last = ns
+        if ns > self.max:
+            self.max = ns
+        self.buckets[min(HISTOGRAM_BUCKETS - 1, (ns // 1000).bit_length())] += 1
+
+    # upper bound (ms) of the bucket that holds the p-th percentile
+    def percentile(self, p):
+        target = self.count * p / 100
+        seen = 0
+        for i, n in enumerate(self.buckets):
+            seen += n
+            if n and seen >= target:
+                return (1 << i) / 1000
+        return 0.0
+
+    def summary(self):
+        return {
+            "count": self.count,
+            "mean_ms": self.total / self.count / 1e6 if self.count else 0.0,
+            "p50_ms": self.percentile(50),
+            "p95_ms": self.percentile(95),
+            "p99_ms": self.percentile(99),
+            "max_ms": self.max / 1e6,
+            "last_ms": self.last / 1e6,
+        }
+
+# --- Global registry ---
+counters = defaultdict(int)
+histograms = defaultdict(Histogram)
+events = deque(maxlen=TRACE_LIMIT)  # (name, start ns, duration ns, thread id)
+thread_names = {}
+tracing = False
+trace_path = None  # set by trace_to(): tracing stays on and is written at exit
+lock = threading.Lock()
+EPOCH = time.perf_counter_ns()
+
+def record(name, start, end):
+    with lock:
+        histograms[name].record(end - start)
+        if tracing:
+            tid = threading.get_ident()
+            events.append((name, start, end - start, tid))
+            if tid not in thread_names:
+                thread_names[tid] = threading.current_thread().name
+
+class Span:
+    __slots__ = ("name", "start")
+
+    def __init__(self, name):
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, *exc):
+        record(self.name, self.start, time.perf_counter_ns())
+
+def span(name):
+    return Span(name)
+
+# decorator form of span()
+def timed(name):
+    def wrap(fn):
+        @functools.wraps(fn)
+        def timed_fn(*args, **kwargs):
+            with Span(name):
+                return fn(*args, **kwargs)
+        return timed_fn
+    return wrap
+
+def count(name, n=1):
+    with lock:
+        counters[name] += n
+
+# last duration of a span in ms (0.0 if it never ran)
+def last_ms(name):
+    h = histograms.get(name)
+    return h.last / 1e6 if h else 0.0
+
+def snapshot():
+    with lock:
+        return {
+            "counters": dict(counters),
+            "histograms": {name: h.summary() for name, h in histograms.items()},
+        }
+
+def report():
+    snap = snapshot()
+    lines = [f"{'span':28} {'count':>8} {'mean ms':>9} {'p95 ms':>9} {'max ms':>9}"]
+    for name, s in sorted(snap["histograms"].items(), key=lambda kv: -kv[1]["mean_ms"] * kv[1]["count"]):
+        lines.append(f"{name:28} {s['count']:>8} {s['mean_ms']:>9.2f} {s['p95_ms']:>9.2f} {s['max_ms']:>9.2f}")
+    for name, value in sorted(snap["counters"].items()):
+        lines.append(f"{name:28} {value:>8}")
+    return "\n".join(lines)
+
+def reset():
+    with lock:
+        counters.clear()
+        histograms.clear()
+        events.clear()
+
+def start_tracing():
+    global tracing
+    tracing = True
+
+def stop_tracing():
+    global tracing
+    tracing = False
+
+# Chrome trace-event JSON: one complete ("X") event per recorded span, thread names, and the
+# counters at dump time
+def dump_trace(path):
+    pid = os.getpid()
+    with lock:
+        recorded = list(events)
+        names = dict(thread_names)
+        totals = dict(counters)
+    trace = [{"name": "thread_name", "ph": "M", "pid": pid, "tid": tid, "args": {"name": name}} for tid, name in names.items()]
+    trace += [{"name": name, "cat": name.split(".")[0], "ph": "X", "pid": pid, "tid": tid,
+               "ts": (start - EPOCH) / 1000, "dur": dur / 1000} for name, start, dur, tid in recorded]
+    if totals:
+        trace.append({"name": "counters", "ph": "C", "pid": pid, "tid": 0,
+                      "ts": (time.perf_counter_ns() - EPOCH) / 1000, "args": totals})
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump({"traceEvents": trace, "displayTimeUnit": "ms"}, f)
+    return len(recorded)
+
+def trace_to(path):
+    global trace_path
+    trace_path = path
+    start_tracing()
+    atexit.register(dump_trace, path)
+
+if TRACE_PATH:
+    trace_to(TRACE_PATH)
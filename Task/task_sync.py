@@ -0,0 +1,318 @@
+# Delta sync between task lists on different machines through a small HTTP server.
+#
+#   python task_sync.py serve --port 8765 --db sync.db     # the server (localhost by default)
+#   python task_sync.py sync http://host:8765              # sync the local task file once
+#   TODO_SYNC_URL=http://host:8765 python to-do_List.py    # the GUI syncs in the background
+#
+# Every synced task has a uid, the server revision of its version (rev, 0 while a local edit
+# is unpushed) and the time of its last edit (mtime). The server keeps only the newest version
+# of each uid, deletes included as tombstones, numbered by a global sequence. A client pulls
+# everything after its sync token (the last sequence number it has seen, minus its own
+# pushes) and pushes its rev-0 tasks plus the tombstones the engine recorded for synced tasks
+# deleted since (see TaskEngine.delete). Conflicts, deletes included, go to the newer mtime
+# (the client id breaks ties): last writer wins. Request
+# and reply bodies are gzip-compressed JSON in batches of SYNC_BATCH changes, so a sync costs
+# bandwidth in proportion to the changes, not to the list size.
+import argparse
+import gzip
+import json
+import os
+import sqlite3
+import sys
+import threading
+import urllib.request
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+from instrument import span, count
+from task_engine import STORAGE_MODE, TASK_FORMAT, Task, TaskEngine, TaskArchive, open_store
+
+SYNC_URL = os.environ.get("TODO_SYNC_URL")  # sync server the GUI syncs with in the background
+SYNC_INTERVAL = float(os.environ.get("TODO_SYNC_INTERVAL", "30"))  # seconds between background syncs
+SYNC_BATCH = 1000  # changes per request
+SYNC_TIMEOUT = 30  # seconds per request
+SYNC_PORT = 8765
+
+def encode_body(data):
+    return gzip.compress(json.dumps(data, ensure_ascii=False).encode("utf-8"), compresslevel=6)
+
+def decode_body(body, encoding):
+    if encoding == "gzip":
+        body = gzip.decompress(body)
+    return json.loads(body) if body else {}
+
+# --- Server ---
+class SyncStore:
+    # The server side: one row per uid holding its newest version (or tombstone) and the
+    # sequence number it was stored under. One connection, used under a lock by all
+    # request threads, so reads see whole pushes.
+    def __init__(self, path):
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.executescript("""
+            CREATE TABLE IF NOT EXISTS changes (
+                uid TEXT PRIMARY KEY,
+                seq INTEGER NOT NULL,
+                mtime INTEGER NOT NULL,
+                client TEXT NOT NULL,
+                deleted INTEGER NOT NULL,
+                task TEXT,
+                completed INTEGER,
+                due_date TEXT
+            );
+            CREATE INDEX IF NOT EXISTS idx_changes_seq ON changes(seq);
+        """)
+        self.lock = threading.Lock()
+
+    def head(self):
+        return self.conn.execute("SELECT COALESCE(MAX(seq), 0) FROM changes").fetchone()[0]
+
+    # changes after `since` not made by `client`; returns (changes, token, more)
+    def changes_since(self, since, client, limit=SYNC_BATCH):
+        with self.lock:
+            rows = self.conn.execute("""
+                SELECT uid, seq, mtime, client, deleted, task, completed, due_date FROM changes
+                WHERE seq > ? AND client != ? ORDER BY seq LIMIT ?
+            """, (since, client, limit + 1)).fetchall()
+            more = len(rows) > limit
+            rows = rows[:limit]
+            # without more pages the token moves past the caller's own changes too
+            token = rows[-1][1] if more else max(since, self.head())
+        changes = []
+        for uid, seq, mtime, author, deleted, text, completed, due in rows:
+            change = {"uid": uid, "seq": seq, "mtime": mtime, "client": author, "deleted": bool(deleted)}
+            if not deleted:
+                change.update(task=text, completed=bool(completed), due_date=due)
+            changes.append(change)
+        return changes, token, more
+
+    # store the changes that are newer than what the server has; returns {uid: seq} for those
+    def push(self, client, changes):
+        revs = {}
+        with self.lock, self.conn:
+            seq = self.head()
+            for change in changes:
+                uid, mtime = change["uid"], int(change["mtime"])
+                row = self.conn.execute("SELECT mtime, client FROM changes WHERE uid = ?", (uid,)).fetchone()
+                if row is not None and (row[0], row[1]) >= (mtime, client):
+                    continue  # the server's version is newer: last writer wins
+                seq += 1
+                deleted = bool(change.get("deleted"))
+                self.conn.execute("""
+                    INSERT OR REPLACE INTO changes (uid, seq, mtime, client, deleted, task, completed, due_date)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                """, (uid, seq, mtime, client, int(deleted), None if deleted else change["task"],
+                      None if deleted else int(change["completed"]), None if deleted else change["due_date"]))
+                revs[uid] = seq
+        return revs
+
+    def close(self):
+        self.conn.close()
+
+class SyncHandler(BaseHTTPRequestHandler):
+    # GET /changes?since=N&client=C&limit=L -> {"changes", "token", "more"}
+    # POST /changes {"client", "changes"} -> {"revs": {uid: seq}}
+    # GET /status -> {"head"}
+    store = None  # set by make_server()
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        if url.path == "/changes":
+            query = parse_qs(url.query)
+            since = int(query.get("since", ["0"])[0])
+            client = query.get("client", [""])[0]
+            limit = min(int(query.get("limit", [SYNC_BATCH])[0]), SYNC_BATCH)
+            changes, token, more = self.store.changes_since(since, client, limit)
+            self.reply({"changes": changes, "token": token, "more": more})
+        elif url.path == "/status":
+            with self.store.lock:
+                self.reply({"head": self.store.head()})
+        else:
+            self.send_error(404)
+
+    def do_POST(self):
+        if urlparse(self.path).path != "/changes":
+            self.send_error(404)
+            return
+        try:
+            body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+            data = decode_body(body, self.headers.get("Content-Encoding"))
+            revs = self.store.push(str(data["client"]), data["changes"])
+        except (ValueError, KeyError, TypeError) as e:
+            self.send_error(400, str(e))
+            return
+        self.reply({"revs": revs})
+
+    def reply(self, data):
+        body = encode_body(data)
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Encoding", "gzip")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass  # quiet; errors still reach the client
+
+def make_server(db_path="sync.db", host="127.0.0.1", port=SYNC_PORT):
+    handler = type("Handler", (SyncHandler,), {"store": SyncStore(db_path)})
+    return ThreadingHTTPServer((host, port), handler)
+
+# --- Client ---
+class SyncClient:
+    # Syncs one task file with a server. The sync token and this client's id live in
+    # `<data>.sync.json`.
+    def __init__(self, url, state_path, batch_size=SYNC_BATCH):
+        self.url = url.rstrip("/")
+        self.state_path = state_path
+        self.batch_size = batch_size
+        self.client = uuid.uuid4().hex
+        self.token = 0
+        if os.path.exists(state_path):
+            with open(state_path, "r", encoding="utf-8") as f:
+                state = json.load(f)
+            self.client, self.token = state["client"], state["token"]
+
+    @classmethod
+    def for_store(cls, url, store):
+        return cls(url, os.path.splitext(store.path)[0] + ".sync.json")
+
+    def save_state(self):
+        tmp = f"{self.state_path}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"client": self.client, "token": self.token}, f)
+        os.replace(tmp, self.state_path)
+
+    def request(self, method, path, data=None):
+        body = encode_body(data) if data is not None else None
+        req = urllib.request.Request(self.url + path, data=body, method=method,
+                                     headers={"Accept-Encoding": "gzip", "Content-Type": "application/json",
+                                              **({"Content-Encoding": "gzip"} if body else {})})
+        with urllib.request.urlopen(req, timeout=SYNC_TIMEOUT) as resp:
+            raw = resp.read()
+            count("sync.bytes_sent", len(body or b""))
+            count("sync.bytes_received", len(raw))
+            return decode_body(raw, resp.headers.get("Content-Encoding"))
+
+    # pull, then push; returns (tasks changed or added here, tasks deleted here, changes pushed)
+    def sync(self, engine):
+        changed, removed = self.pull(engine)
+        pushed = self.push(engine)
+        self.save_state()
+        return changed, removed, pushed
+
+    def pull(self, engine):
+        changed, removed = [], []
+        by_uid = tombstones = None  # read once something arrives
+        with span("sync.pull"):
+            while True:
+                reply = self.request("GET", f"/changes?since={self.token}&client={self.client}&limit={self.batch_size}")
+                if reply["changes"]:
+                    if by_uid is None:
+                        tombstones = engine.tombstones()
+                        with engine.lock:
+                            by_uid = {t.uid: t for t in engine.model if t.uid is not None}
+                    c, r = self.apply(engine, reply["changes"], by_uid, tombstones)
+                    changed += c
+                    removed += r
+                self.token = reply["token"]
+                if not reply["more"]:
+                    break
+        return changed, removed
+
+    def apply(self, engine, changes, by_uid, tombstones):
+        # archived tasks are brought back when they change elsewhere
+        missing = [c["uid"] for c in changes if c["uid"] not in by_uid]
+        if missing and engine.archive is not None:
+            archived = engine.archive.get_uids(missing)
+            for task in engine.unarchive([t.id for t in archived]):
+                by_uid[task.uid] = task
+        put, deleted, revived = [], [], []
+        with engine.lock:
+            for change in changes:
+                uid = change["uid"]
+                local = by_uid.get(uid)
+                if local is not None and local.rev == 0 and (local.mtime, self.client) > (change["mtime"], change["client"]):
+                    continue  # our unpushed edit is newer and wins when pushed
+                if local is None and uid in tombstones:
+                    if (tombstones[uid], self.client) > (change["mtime"], change["client"]):
+                        continue  # deleted here after that change; the tombstone wins when pushed
+                    revived.append(uid)  # changed elsewhere after we deleted it
+                    del tombstones[uid]
+                if change["deleted"]:
+                    if local is not None:
+                        deleted.append(local.id)
+                        del by_uid[uid]
+                elif local is None or local.rev != change["seq"]:
+                    put.append(Task(local.id if local is not None else None, change["task"], change["completed"],
+                                    change["due_date"], uid, change["seq"], change["mtime"]))
+        changed, removed = engine.apply_sync(put, deleted)
+        if revived:
+            engine.drop_tombstones(revived)
+        for task in changed:
+            by_uid[task.uid] = task
+        count("sync.pulled", len(changes))
+        return changed, removed
+
+    def push(self, engine):
+        engine.assign_uids()
+        engine.flush()  # uids are on disk before the server sees them
+        with engine.lock:
+            dirty = [t.copy() for t in engine.model if t.rev == 0]
+        changes = [{"uid": t.uid, "mtime": t.mtime, "task": t.task, "completed": t.completed, "due_date": t.due_date}
+                   for t in dirty]
+        # deletes go out with the time they were made, so an old offline delete loses to newer edits
+        changes += [{"uid": uid, "mtime": mtime, "deleted": True} for uid, mtime in sorted(engine.tombstones().items())]
+        pushed = 0
+        with span("sync.push"):
+            for start in range(0, len(changes), self.batch_size):
+                batch = changes[start:start + self.batch_size]
+                revs = self.request("POST", "/changes", {"client": self.client, "changes": batch})["revs"]
+                tasks = dirty[start:start + self.batch_size]
+                engine.mark_synced([(t.id, t.uid, t.mtime, revs[t.uid]) for t in tasks if t.uid in revs])
+                # sent; a rejected one means the server has a newer version, which the next pull brings
+                engine.drop_tombstones([c["uid"] for c in batch if c.get("deleted")])
+                pushed += len(revs)
+        count("sync.pushed", pushed)
+        return pushed
+
+# --- Command line ---
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Task sync server and client.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    serve = sub.add_parser("serve", help="run a sync server")
+    serve.add_argument("--host", default="127.0.0.1", help="interface to listen on (0.0.0.0 for the network)")
+    serve.add_argument("--port", type=int, default=SYNC_PORT)
+    serve.add_argument("--db", default="sync.db", help="server database")
+    once = sub.add_parser("sync", help="sync the local task file with a server once")
+    once.add_argument("url", nargs="?", default=SYNC_URL)
+    once.add_argument("--storage", default=STORAGE_MODE, choices=["journal", "json", "sqlite"])
+    once.add_argument("--data", default=None, help="task file (default $TODO_DATA, else tasks.json / tasks.db)")
+    once.add_argument("--format", default=TASK_FORMAT, choices=["json", "binary"])
+    args = parser.parse_args(argv)
+
+    if args.command == "serve":
+        server = make_server(args.db, args.host, args.port)
+        print(f"sync server on http://{args.host}:{server.server_address[1]} ({args.db})", file=sys.stderr)
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        server.server_close()
+        return 0
+
+    if not args.url:
+        parser.error("no server URL (pass one or set TODO_SYNC_URL)")
+    store = open_store(args.storage, args.data, args.format)
+    engine = TaskEngine(store, archive=TaskArchive.for_store(store))
+    engine.load()
+    try:
+        changed, removed, pushed = SyncClient.for_store(args.url, store).sync(engine)
+    finally:
+        engine.close()
+    print(f"pulled {len(changed)} changed and {len(removed)} deleted tasks, pushed {pushed} changes", file=sys.stderr)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,52 +1,49 @@
 
-import json
+import time
+START_TIME = time.perf_counter()  # --profile-startup measures from here
+
 import os
-import csv
+import sys
+import threading
 import customtkinter as ctk
 from tkinter import messagebox, Toplevel, filedialog
-from tkcalendar import Calendar
-from datetime import datetime, date
+from datetime import datetime, date, timedelta
 from pathlib import Path
 
-# Optional pandas for Excel export/import
-try:
-    import pandas as pd
-    PANDAS_AVAILABLE = True
-except Exception:
-    PANDAS_AVAILABLE = False
+# All task logic lives in the headless engine. Heavy or rarely used modules (csv, gzip,
+# tkcalendar, openpyxl) are imported where they are first needed so they never slow down startup.
+import instrument
+from task_engine import STORAGE_MODE, OPENPYXL_AVAILABLE, WRITE_DELAY, TaskEngine, TaskArchive, open_store, QueryPage, CsvImport, BulkImport, TaskExport
+IMPORTS_DONE = time.perf_counter()
 
 # --- Constants ---
-TASK_FILE = "tasks.json"
-
-# --- File I/O ---
-def save_tasks(tasks):
-    with open(TASK_FILE, "w", encoding="utf-8") as f:
-        json.dump(tasks, f, indent=4, ensure_ascii=False)
-
-def load_tasks():
-    if not os.path.exists(TASK_FILE):
-        return []
-    with open(TASK_FILE, "r", encoding="utf-8") as f:
-        return json.load(f)
-
-def generate_task_id(tasks):
-    if not tasks:
-        return 1
-    return max(task["id"] for task in tasks) + 1
+SEARCH_DELAY_MS = 150  # debounce for the live search box
+QUERY_POLL_MS = 20  # how often the Tk thread checks for a finished background query
+EXTERNAL_POLL_MS = 1000  # how often to look for changes written by other instances
+REMINDER_LINES = 25  # tasks listed in a reminder popup before "... and N more"
+OVERLAY_POLL_MS = 1000  # refresh rate of the performance overlay while it is shown
 
 # --- Calendar Popup (improved) ---
 class CalendarPopup(Toplevel):
-    def __init__(self, parent, callback, current_date=None):
+    # heat map colors: open tasks by load relative to the busiest day on screen (light -> dark),
+    # days with overdue open tasks, and days whose tasks are all completed
+    HEAT_COLORS = [("#dbeafe", "black"), ("#93c5fd", "black"), ("#3b82f6", "white"), ("#1e40af", "white")]
+    OVERDUE_COLOR = ("#ffb3b3", "black")
+    DONE_COLOR = ("#c8f7d4", "black")
+
+    def __init__(self, parent, callback, current_date=None, day_counts=None):
         super().__init__(parent)
         self.title("📅 Select Date")
         self.geometry("520x460")
         self.resizable(False, False)
         self.callback = callback
+        self.day_counts = day_counts  # day_counts(first, last) -> {ordinal: (open, completed)}
         self.grab_set()
         self.focus_force()
 
         dt = current_date if current_date else datetime.today()
 
+        from tkcalendar import Calendar
         self.cal = Calendar(
             self,
             selectmode='day',
@@ -68,12 +65,15 @@ class CalendarPopup(Toplevel):
         )
         self.cal.pack(padx=12, pady=12, fill="both", expand=True)
 
-        # Mark today
+        # Mark today and color the days by load; only the month on screen gets events
         try:
-            today = datetime.today().date()
-            self.cal.calevent_remove('all')
-            self.cal.calevent_create(today, 'Today', 'today')
             self.cal.tag_config('today', background='#ffef8a', foreground='black')
+            for i, (bg, fg) in enumerate(self.HEAT_COLORS):
+                self.cal.tag_config(f'load{i}', background=bg, foreground=fg)
+            self.cal.tag_config('overdue', background=self.OVERDUE_COLOR[0], foreground=self.OVERDUE_COLOR[1])
+            self.cal.tag_config('done', background=self.DONE_COLOR[0], foreground=self.DONE_COLOR[1])
+            self.mark_month()
+            self.cal.bind("<<CalendarMonthChanged>>", lambda e: self.mark_month())
         except Exception:
             pass
 
@@ -82,6 +82,25 @@ class CalendarPopup(Toplevel):
         ctk.CTkButton(btn_frame, text="✅ Select", width=120, command=self.select_date).grid(row=0, column=0, padx=12)
         ctk.CTkButton(btn_frame, text="❌ Cancel", width=120, fg_color="red", command=self.destroy).grid(row=0, column=1, padx=12)
 
+    def mark_month(self):
+        self.cal.calevent_remove('all')
+        today = date.today()
+        if self.day_counts is not None:
+            month, year = self.cal.get_displayed_month()
+            # the grid also shows the end of the previous and the start of the next month
+            first = date(year, month, 1).toordinal() - 7
+            counts = self.day_counts(first, first + 7 + 31 + 14)
+            busiest = max((n_open for n_open, _ in counts.values()), default=0)
+            for day, (n_open, n_done) in counts.items():
+                if n_open and day < today.toordinal():
+                    tag = 'overdue'
+                elif n_open:
+                    tag = f'load{(len(self.HEAT_COLORS) * n_open - 1) // busiest}'
+                else:
+                    tag = 'done'
+                self.cal.calevent_create(date.fromordinal(day), f"{n_open} open, {n_done} completed", tag)
+        self.cal.calevent_create(today, 'Today', 'today')
+
     def select_date(self):
         try:
             d = self.cal.selection_get()
@@ -96,6 +115,223 @@ class CalendarPopup(Toplevel):
         self.callback(d.strftime("%Y-%m-%d"))
         self.destroy()
 
+# --- Query worker ---
+class QueryWorker:
+    # Runs a query function on a background thread. Only the newest request matters: submit()
+    # supersedes anything queued or running (checked between phases), and the finished
+    # result (or the exception the query raised) is picked up on the Tk thread by polling
+    # with after().
+    def __init__(self, widget, on_result, on_error):
+        self.widget = widget
+        self.on_result = on_result
+        self.on_error = on_error
+        self.cond = threading.Condition()
+        self.generation = 0
+        self.pending = None
+        self.done = None  # (generation, tasks, error) waiting for the Tk thread
+        self.dropped = 0  # generation dropped by supersede(); nothing left to wait for
+        self.polling = False
+        threading.Thread(target=self.run, daemon=True).start()
+
+    # fn(*args, cancelled=...) returns the ordered tasks, or None once cancelled
+    def submit(self, fn, *args):
+        with self.cond:
+            self.generation += 1
+            self.pending = (self.generation, fn, args)
+            self.cond.notify()
+        if not self.polling:
+            self.polling = True
+            self.widget.after(QUERY_POLL_MS, self.poll)
+
+    # drop whatever is queued or running, e.g. because the result was served from the cache
+    def supersede(self):
+        with self.cond:
+            self.generation += 1
+            self.dropped = self.generation
+            self.pending = None
+
+    def run(self):
+        while True:
+            with self.cond:
+                while self.pending is None:
+                    self.cond.wait()
+                gen, fn, args = self.pending
+                self.pending = None
+            try:
+                result, error = fn(*args, cancelled=lambda: gen != self.generation), None
+            except Exception as e:
+                result, error = None, e  # reported on the Tk thread; the worker keeps running
+            if (result is not None or error is not None) and gen == self.generation:
+                self.done = (gen, result, error)
+
+    def poll(self):
+        done, self.done = self.done, None
+        if done is not None and done[0] == self.generation:
+            self.polling = False
+            if done[2] is not None:
+                self.on_error(done[2])
+            else:
+                self.on_result(done[1])
+        elif self.dropped == self.generation:
+            self.polling = False
+        else:
+            self.widget.after(QUERY_POLL_MS, self.poll)
+
+# --- Virtualized task list ---
+class TaskRow:
+    # one pooled row (frame + label + quick buttons); rebound to another task while scrolling
+    def __init__(self, parent, app):
+        self.task = None
+        self.frame = ctk.CTkFrame(parent, corner_radius=8, height=VirtualTaskList.ROW_HEIGHT)
+        self.frame.pack_propagate(False)
+        self.default_bg = self.frame.cget("fg_color")
+
+        self.label = ctk.CTkLabel(self.frame, text="", anchor="w", font=("Arial", 13))
+        self.label.pack(side="left", fill="x", expand=True, padx=10, pady=8)
+
+        btn_frame = ctk.CTkFrame(self.frame, fg_color="transparent")
+        btn_frame.pack(side="right", padx=8)
+        ctk.CTkButton(btn_frame, text="✏️", width=48, height=36, command=lambda: self.task and app.open_update_dialog(self.task)).grid(row=0, column=0, padx=4)
+        ctk.CTkButton(btn_frame, text="🔄", width=48, height=36, command=lambda: self.task and app.open_toggle_dialog(self.task)).grid(row=0, column=1, padx=4)
+        ctk.CTkButton(btn_frame, text="🗑️", width=48, height=36, command=lambda: self.task and app.open_delete_dialog(self.task)).grid(row=0, column=2, padx=4)
+
+        # bind click selection on entire row (toggle on second click); ctrl adds/removes, shift selects a range
+        self.index = None  # position of self.task in the list's items
+        for widget in (self.frame, self.label):
+            widget.bind("<Button-1>", lambda e: self.task and app.select_row(self))
+            widget.bind("<Control-Button-1>", lambda e: self.task and app.select_row(self, "toggle"))
+            widget.bind("<Shift-Button-1>", lambda e: self.task and app.select_row(self, "range"))
+
+class VirtualTaskList(ctk.CTkFrame):
+    # Only the rows in the viewport (plus a small overscan) get widgets. The pool is sized
+    # from the viewport height and reused while scrolling, so widget count and redraw time
+    # do not depend on how many tasks are in the list.
+    ROW_HEIGHT = 52
+    ROW_PAD = 4
+    OVERSCAN = 2
+
+    def __init__(self, parent, app, bind_row, **kwargs):
+        super().__init__(parent, **kwargs)
+        self.app = app
+        self.bind_row = bind_row  # bind_row(row, task) fills a pooled row for a task
+        self.items = []
+        self.rows = []
+        self.bound = {}  # task id -> row currently showing that task
+        self.top = 0  # index of the first item shown
+
+        self.grid_rowconfigure(0, weight=1)
+        self.grid_columnconfigure(0, weight=1)
+        self.viewport = ctk.CTkFrame(self, fg_color="transparent")
+        self.viewport.grid(row=0, column=0, sticky="nsew")
+        self.viewport.grid_propagate(False)
+        self.viewport.grid_columnconfigure(0, weight=1)
+        self.scrollbar = ctk.CTkScrollbar(self, command=self.yview)
+        self.scrollbar.grid(row=0, column=1, sticky="ns")
+
+        self.viewport.bind("<Configure>", lambda e: self.resize_pool())
+        if sys.platform.startswith("linux"):
+            self.bind_all("<Button-4>", self.on_mousewheel, add=True)
+            self.bind_all("<Button-5>", self.on_mousewheel, add=True)
+        else:
+            self.bind_all("<MouseWheel>", self.on_mousewheel, add=True)
+
+    def row_pitch(self):
+        scaling = ctk.ScalingTracker.get_widget_scaling(self)
+        return max(1, int((self.ROW_HEIGHT + 2 * self.ROW_PAD) * scaling))
+
+    def visible_count(self):
+        return max(1, self.viewport.winfo_height() // self.row_pitch())
+
+    def resize_pool(self):
+        needed = self.visible_count() + self.OVERSCAN
+        while len(self.rows) < needed:
+            row = TaskRow(self.viewport, self.app)
+            row.frame.grid(row=len(self.rows), column=0, sticky="ew", padx=6, pady=self.ROW_PAD)
+            self.rows.append(row)
+        self.render()
+
+    def set_items(self, items):
+        self.items = items
+        self.render()
+
+    def scroll_to(self, index):
+        index = max(0, min(index, len(self.items) - self.visible_count()))
+        if index != self.top:
+            self.top = index
+            self.render()
+
+    def yview(self, *args):
+        if not args:
+            return
+        if args[0] == "moveto":
+            self.scroll_to(int(float(args[1]) * len(self.items)))
+        elif args[0] == "scroll":
+            step = int(args[1])
+            if len(args) > 2 and args[2] == "pages":
+                step *= self.visible_count()
+            self.scroll_to(self.top + step)
+
+    def on_mousewheel(self, event):
+        # only react when the pointer is over this list
+        if not str(event.widget).startswith(str(self)):
+            return
+        if event.num == 4:
+            step = -1
+        elif event.num == 5:
+            step = 1
+        elif sys.platform.startswith("win"):
+            step = -int(event.delta / 120) or (-1 if event.delta > 0 else 1)
+        else:
+            step = -event.delta
+        self.scroll_to(self.top + step * 3)
+
+    # re-fill only the row showing this task (no-op when it is scrolled out of view)
+    def update_task(self, task_id):
+        row = self.bound.get(task_id)
+        if row is not None:
+            self.bind_row(row, row.task)
+
+    # re-fill every bound row in place, e.g. after an appearance-mode switch
+    def restyle(self):
+        for row in self.bound.values():
+            self.bind_row(row, row.task)
+
+    # re-fill the bound rows whose task matches, e.g. the ones whose due status changed
+    def update_where(self, predicate):
+        for row in self.bound.values():
+            if predicate(row.task):
+                self.bind_row(row, row.task)
+
+    def render(self):
+        with instrument.span("list.render"):
+            self.render_rows()
+
+    def render_rows(self):
+        self.top = max(0, min(self.top, len(self.items) - self.visible_count()))
+        self.bound = {}
+        for i, row in enumerate(self.rows):
+            idx = self.top + i
+            # a paged query can name a task deleted since it was read; its row is skipped
+            task = self.items[idx] if idx < len(self.items) else None
+            if task is not None:
+                row.task = task
+                row.index = idx
+                self.bound[row.task["id"]] = row
+                self.bind_row(row, row.task)
+                row.frame.grid()
+            else:
+                row.task = None
+                row.frame.grid_remove()
+        n = len(self.items)
+        if n:
+            self.scrollbar.set(self.top / n, min(1.0, (self.top + self.visible_count()) / n))
+        else:
+            self.scrollbar.set(0.0, 1.0)
+
+# every Tk widget under (and including) w
+def count_widgets(w):
+    return 1 + sum(count_widgets(c) for c in w.winfo_children())
+
 # --- Custom dialogs (Update/Delete/Toggle) ---
 class UpdateTaskDialog(ctk.CTkToplevel):
     def __init__(self, parent, task, save_callback):
@@ -136,7 +372,7 @@ class UpdateTaskDialog(ctk.CTkToplevel):
             cur = datetime.strptime(self.due_date_var.get(), "%Y-%m-%d")
         except Exception:
             cur = datetime.today()
-        CalendarPopup(self, cb, cur)
+        CalendarPopup(self, cb, cur, self.master.engine.day_counts)
 
     def save(self):
         new_text = self.task_entry.get().strip()
@@ -195,6 +431,25 @@ class ToggleTaskDialog(ctk.CTkToplevel):
         self.toggle_callback(self.task)
         self.destroy()
 
+class ProgressDialog(ctk.CTkToplevel):
+    def __init__(self, parent, title, cancel_callback):
+        super().__init__(parent)
+        self.title(title)
+        self.geometry("420x180")
+        self.resizable(False, False)
+
+        self.label = ctk.CTkLabel(self, text="Starting...", font=("Arial", 14))
+        self.label.pack(pady=(18, 8))
+        self.bar = ctk.CTkProgressBar(self, width=360)
+        self.bar.set(0)
+        self.bar.pack(pady=8)
+        ctk.CTkButton(self, text="❌ Cancel", width=120, fg_color="red", command=cancel_callback).pack(pady=12)
+        self.protocol("WM_DELETE_WINDOW", cancel_callback)
+
+    def update_progress(self, fraction, text):
+        self.bar.set(fraction)
+        self.label.configure(text=text)
+
 # --- Main App ---
 class TaskManagerApp(ctk.CTk):
     ROW_BG = {
@@ -204,20 +459,41 @@ class TaskManagerApp(ctk.CTk):
         "normal": None
     }
 
-    def __init__(self):
+    def __init__(self, profile_startup=False, data_path=None):
         super().__init__()
         self.title("🚀 Advanced Task Manager")
         self.geometry("1300x880")
         ctk.set_appearance_mode("dark")
         ctk.set_default_color_theme("blue")
 
-        # State
-        self.tasks = load_tasks()
+        # State (tasks are loaded in the background once the window is up, see start_loading)
+        self.profile_startup = profile_startup
+        self.startup_times = {"imports": (IMPORTS_DONE - START_TIME) * 1000}
+        # store + model, search index and sorted views; edits are saved in the background.
+        # Old completed tasks live in the archive next to the data file (see TaskEngine.archive_old)
+        store = open_store(STORAGE_MODE, data_path)
+        self.engine = TaskEngine(store, write_delay=WRITE_DELAY, archive=TaskArchive.for_store(store))
+        self.sync_thread = None  # background merge of other instances' changes
+        self.seen_external = 0  # engine.external_version the list was last refreshed for
+        self.save_error = None  # failing background save, once reported
+        # delta sync with a server (TODO_SYNC_URL) in the background; the HTTP client is only
+        # imported when one is configured
+        self.sync_client = None
+        if os.environ.get("TODO_SYNC_URL"):
+            import task_sync
+            self.sync_client = task_sync.SyncClient.for_store(task_sync.SYNC_URL, store)
+            self.sync_interval_ms = int(task_sync.SYNC_INTERVAL * 1000)
+        self.server_sync_thread = None
+        self.loaded = False
+        self.search_job = None
+        self.refresh_started = None  # perf_counter_ns() of the refresh being waited for
+        self.query_worker = QueryWorker(self, self.show_results, self.query_failed)
         self.filter_var = ctk.StringVar(value="All")
         self.sort_var = ctk.StringVar(value="ID (Ascending)")
         self.search_var = ctk.StringVar(value="")
         # ensure no pre-selection at startup
-        self.selected_task_id = None  # selected via clicking row
+        self.selected_ids = set()  # selected via clicking rows
+        self.anchor_index = None  # list position of the last plain/ctrl click, start of shift ranges
 
         # Layout using grid so footer always visible
         self.grid_rowconfigure(4, weight=1)  # task list row expands
@@ -253,7 +529,7 @@ class TaskManagerApp(ctk.CTk):
         ctk.CTkLabel(options_frame, text="Search:", font=("Arial", 14)).grid(row=0, column=0, padx=8, pady=6)
         self.search_entry = ctk.CTkEntry(options_frame, textvariable=self.search_var, placeholder_text="Type to search (live)...")
         self.search_entry.grid(row=0, column=1, padx=8, pady=6, sticky="ew")
-        self.search_entry.bind("<KeyRelease>", lambda e: self.refresh_list())
+        self.search_entry.bind("<KeyRelease>", lambda e: self.schedule_search())
 
         # Filter
         ctk.CTkLabel(options_frame, text="Filter:", font=("Arial", 14)).grid(row=0, column=2, padx=8, pady=6)
@@ -267,7 +543,8 @@ class TaskManagerApp(ctk.CTk):
                                                "ID (Ascending)", "ID (Descending)",
                                                "Alphabetical (A-Z)", "Alphabetical (Z-A)",
                                                "Completed First", "Not Completed First",
-                                               "Due Date (Sooner First)", "Due Date (Latest First)"
+                                               "Due Date (Sooner First)", "Due Date (Latest First)",
+                                               "Best Match"
                                            ],
                                            variable=self.sort_var, command=lambda _: self.refresh_list())
         self.sort_menu.grid(row=0, column=5, padx=8, pady=6)
@@ -277,7 +554,12 @@ class TaskManagerApp(ctk.CTk):
         io_frame.grid(row=0, column=6, padx=10, pady=6)
         ctk.CTkButton(io_frame, text="⬆️ Export CSV", width=120, command=self.export_csv).grid(row=0, column=0, padx=6)
         ctk.CTkButton(io_frame, text="⬆️ Export Excel", width=120, command=self.export_excel).grid(row=0, column=1, padx=6)
-        ctk.CTkButton(io_frame, text="⬇️ Import CSV", width=120, command=self.import_csv).grid(row=0, column=2, padx=6)
+        self.import_button = ctk.CTkButton(io_frame, text="⬇️ Import CSV", width=120, command=self.import_csv)
+        self.import_button.grid(row=0, column=2, padx=6)
+        self.import_dir_button = ctk.CTkButton(io_frame, text="📁 Import Folder", width=120, command=self.import_folder)
+        self.import_dir_button.grid(row=0, column=3, padx=6)
+        self.export_view_var = ctk.BooleanVar(value=False)
+        ctk.CTkCheckBox(io_frame, text="Export current view only", variable=self.export_view_var).grid(row=0, column=4, padx=6)
 
         # Task list area
         list_frame = ctk.CTkFrame(self, corner_radius=12)
@@ -285,7 +567,7 @@ class TaskManagerApp(ctk.CTk):
         list_frame.grid_rowconfigure(0, weight=1)
         list_frame.grid_columnconfigure(0, weight=1)
 
-        self.task_list = ctk.CTkScrollableFrame(list_frame, width=1240, height=520)
+        self.task_list = VirtualTaskList(list_frame, self, self.fill_row, width=1240, height=520, fg_color="transparent")
         self.task_list.grid(row=0, column=0, sticky="nsew", padx=8, pady=8)
 
         # Footer buttons (always visible)
@@ -307,10 +589,213 @@ class TaskManagerApp(ctk.CTk):
         # Selected label to show current selected task
         self.selected_label = ctk.CTkLabel(footer, text="Selected: None", anchor="e")
         self.selected_label.grid(row=0, column=4, sticky="e", padx=8)
+        # shown while background saves are failing (see check_save_error)
+        self.save_error_label = ctk.CTkLabel(footer, text="", text_color="#ff6b6b", anchor="w")
+        self.save_error_label.grid(row=3, column=0, columnspan=6, sticky="w", padx=8, pady=(6, 0))
+        self.save_error_label.grid_remove()
+
+        # bulk actions on the selection: one store write and one list update each
+        bulk_frame = ctk.CTkFrame(footer, fg_color="transparent")
+        bulk_frame.grid(row=1, column=0, columnspan=6, sticky="w", pady=(6, 0))
+        ctk.CTkButton(bulk_frame, text="☑️ Select All", width=130, command=self.select_all).grid(row=0, column=0, padx=8)
+        ctk.CTkButton(bulk_frame, text="✅ Complete", width=130, command=lambda: self.bulk_set_completed(True)).grid(row=0, column=1, padx=8)
+        ctk.CTkButton(bulk_frame, text="↩️ Reopen", width=130, command=lambda: self.bulk_set_completed(False)).grid(row=0, column=2, padx=8)
+        ctk.CTkButton(bulk_frame, text="📅 Reschedule", width=130, command=self.bulk_reschedule).grid(row=0, column=3, padx=8)
+        ctk.CTkButton(bulk_frame, text="🗑️ Delete Selected", width=150, command=self.bulk_delete).grid(row=0, column=4, padx=8)
+        ctk.CTkButton(bulk_frame, text="Clear Selection", width=130, command=self.clear_selection).grid(row=0, column=5, padx=8)
+        self.bind_all("<Control-a>", lambda e: self.outside_entry(e) and self.select_all())
+        self.bind_all("<Escape>", lambda e: self.outside_entry(e) and self.clear_selection())
+        self.bind_all("<Delete>", lambda e: self.outside_entry(e) and self.bulk_delete())
+
+        # performance overlay (F12): last refresh split into query phases and widget build
+        self.overlay_var = ctk.BooleanVar(value=False)
+        ctk.CTkCheckBox(footer, text="📊 Perf", variable=self.overlay_var, command=self.toggle_overlay).grid(row=0, column=5, padx=8)
+        self.overlay_frame = ctk.CTkFrame(footer, fg_color="transparent")
+        self.overlay_frame.grid_columnconfigure(0, weight=1)
+        self.overlay_label = ctk.CTkLabel(self.overlay_frame, text="", anchor="w", font=("Consolas", 12))
+        self.overlay_label.grid(row=0, column=0, sticky="ew", padx=8)
+        ctk.CTkButton(self.overlay_frame, text="💾 Save Trace", width=120, command=self.save_trace).grid(row=0, column=1, padx=8)
+        self.bind_all("<F12>", lambda e: (self.overlay_var.set(not self.overlay_var.get()), self.toggle_overlay()))
+
+        # show the window first; load, index and render the tasks in the background
+        self.mark_startup("window")
+        self.protocol("WM_DELETE_WINDOW", self.on_close)
+        self.start_loading()
+
+    def mark_startup(self, phase):
+        self.startup_times[phase] = (time.perf_counter() - START_TIME) * 1000
+
+    def start_loading(self):
+        self.add_button.configure(state="disabled")
+        self.import_button.configure(state="disabled")
+        self.import_dir_button.configure(state="disabled")
+        self.selected_label.configure(text="Loading tasks...")
+        result = {}
+        # a binary task file can be paged from disk right away; it is replaced once loaded
+        try:
+            result["preview"] = self.engine.store.preview()
+        except Exception:
+            result["preview"] = None
+        if result["preview"] is not None:
+            self.task_list.set_items(result["preview"])
 
-        # initial render and startup reminders
+        def load():
+            try:
+                self.engine.load()
+            except Exception as e:
+                result["error"] = e
+                return
+            try:
+                self.engine.archive_old()
+            except Exception:
+                pass  # the tasks just stay in the working set; retried at the next start/midnight
+
+        thread = threading.Thread(target=load, daemon=True)
+        thread.start()
+        self.after(QUERY_POLL_MS, lambda: self.finish_loading(thread, result))
+
+    def finish_loading(self, thread, result):
+        if thread.is_alive():
+            self.after(QUERY_POLL_MS, lambda: self.finish_loading(thread, result))
+            return
+        if result["preview"] is not None:
+            self.task_list.set_items([])
+            result["preview"].close()
+        if "error" in result:
+            # leave adding disabled so a broken task file is never overwritten
+            self.selected_label.configure(text="Selected: None")
+            messagebox.showerror("Load Failed", f"Could not load tasks:\n{result['error']}")
+            return
+        self.loaded = True
+        self.mark_startup("load")
+        self.add_button.configure(state="normal")
+        self.import_button.configure(state="normal")
+        self.import_dir_button.configure(state="normal")
         self.refresh_list()
-        self.startup_reminder()
+        if not self.profile_startup:
+            self.after(200, self.startup_reminder)
+            self.after(EXTERNAL_POLL_MS, self.poll_external)
+            if self.sync_client is not None:
+                self.after(0, self.poll_server_sync)
+
+    # other instances may share the data file: merge their writes in the background and
+    # refresh once something actually changed
+    def poll_external(self):
+        if (self.sync_thread is None or not self.sync_thread.is_alive()) and self.engine.poll():
+            self.sync_thread = threading.Thread(target=self.sync_external, daemon=True)
+            self.sync_thread.start()
+        if self.engine.external_version != self.seen_external:
+            self.seen_external = self.engine.external_version
+            self.refresh_list()
+            self.update_selected_label()
+        self.check_save_error()
+        self.after(EXTERNAL_POLL_MS, self.poll_external)
+
+    # A failed background save keeps the changes pending. Say so in the footer (and once in a
+    # dialog) and retry every poll until a write goes through.
+    def check_save_error(self, error=None):
+        writer = self.engine.writer
+        error = error or (writer.error if writer is not None else None)
+        if error is None:
+            if self.save_error is not None:
+                self.save_error = None
+                self.save_error_label.grid_remove()
+            return
+        self.save_error_label.configure(text=f"⚠️ Changes are not being saved: {error} (retrying)")
+        self.save_error_label.grid()
+        if writer is not None:
+            writer.schedule()
+        if self.save_error is None:
+            self.save_error = error
+            messagebox.showerror("Save Failed", f"Your changes could not be saved:\n{error}\n\n"
+                                 "They are kept and saving is retried in the background. Closing the app asks before discarding them.")
+
+    def sync_external(self):
+        try:
+            self.engine.sync()
+        except Exception:
+            pass  # e.g. a file caught mid-replace on Windows; the next poll retries
+
+    # pulled changes bump engine.external_version, so poll_external refreshes the list
+    def poll_server_sync(self):
+        if self.server_sync_thread is None or not self.server_sync_thread.is_alive():
+            self.server_sync_thread = threading.Thread(target=self.sync_server, daemon=True)
+            self.server_sync_thread.start()
+        self.after(self.sync_interval_ms, self.poll_server_sync)
+
+    def sync_server(self):
+        try:
+            self.sync_client.sync(self.engine)
+        except Exception:
+            pass  # server unreachable; local edits keep rev 0 and go out with the next sync
+
+    # --- Performance overlay ---
+    def toggle_overlay(self):
+        if self.overlay_var.get():
+            # tracing only costs anything while someone is looking
+            instrument.start_tracing()
+            self.overlay_frame.grid(row=2, column=0, columnspan=6, sticky="ew", pady=(6, 0))
+            self.poll_overlay()
+        else:
+            if not instrument.trace_path:
+                instrument.stop_tracing()
+            self.overlay_frame.grid_remove()
+
+    def poll_overlay(self):
+        if self.overlay_var.get():
+            self.update_overlay()
+            self.after(OVERLAY_POLL_MS, self.poll_overlay)
+
+    def update_overlay(self):
+        if not self.overlay_var.get():
+            return
+        ms = instrument.last_ms
+        total = instrument.histograms.get("refresh.total")
+        p95 = total.percentile(95) if total else 0.0
+        if self.engine.store.supports_query:
+            phases = f"page {ms('query.page'):.1f}"
+        else:
+            phases = f"sort {ms('query.sort'):.1f} · search {ms('query.search'):.1f} · filter {ms('query.filter'):.1f}"
+        widgets = count_widgets(self)
+        self.overlay_label.configure(text=(
+            f"refresh {ms('refresh.total'):.1f} ms (p95 {p95:.1f}) = {phases} · build {ms('refresh.build'):.1f}"
+            f"  |  rows {len(self.task_list.items):,}  |  widgets {widgets:,}"
+            f"  |  saves {instrument.counters.get('store.commits', 0)} ({ms('store.commit'):.1f} ms)"))
+
+    def save_trace(self):
+        path = filedialog.asksaveasfilename(defaultextension=".json", filetypes=[("Chrome trace", "*.json")], initialfile="todo-trace.json")
+        if not path:
+            return
+        try:
+            n = instrument.dump_trace(path)
+        except Exception as e:
+            messagebox.showerror("Trace Failed", f"Could not write trace:\n{e}")
+            return
+        messagebox.showinfo("Trace Saved", f"{n} events written to {path}.\nOpen it in chrome://tracing or ui.perfetto.dev.")
+
+    # write out any edits still waiting for the background writer, then quit
+    def on_close(self):
+        try:
+            self.engine.flush()
+        except Exception as e:
+            if not messagebox.askyesno("Save Failed", f"Could not save tasks:\n{e}\n\nQuit anyway and lose the unsaved changes?"):
+                return
+        try:
+            self.engine.close()
+        except Exception:
+            pass  # the failure was reported by the flush above
+        self.destroy()
+
+    # called once the first list of rows has been drawn
+    def first_paint(self):
+        self.mark_startup("first paint")
+        if self.profile_startup:
+            t = self.startup_times
+            print(f"imports:     {t['imports']:8.1f} ms")
+            print(f"window:      {t['window']:8.1f} ms")
+            print(f"load:        {t['load']:8.1f} ms  ({len(self.engine.model)} tasks, {STORAGE_MODE} storage)")
+            print(f"first paint: {t['first paint']:8.1f} ms")
+            self.destroy()
 
     # Calendar open for add
     def open_add_calendar(self, event):
@@ -320,211 +805,289 @@ class TaskManagerApp(ctk.CTk):
             cur = datetime.strptime(self.due_date_var.get(), "%Y-%m-%d")
         except Exception:
             cur = datetime.today()
-        CalendarPopup(self, cb, cur)
-
-    # parse helper
-    def parse_date(self, ds):
-        if not ds or ds == "No due date":
-            return datetime.max
-        try:
-            return datetime.strptime(ds, "%Y-%m-%d")
-        except Exception:
-            return datetime.max
+        CalendarPopup(self, cb, cur, self.engine.day_counts if self.loaded else None)
 
-    # refresh list (live search + filter + sort) and create clickable rows
+    # refresh list (live search + filter + sort); the virtual list binds only the visible rows
     def refresh_list(self):
-        # clear
-        for w in self.task_list.winfo_children():
-            w.destroy()
-
+        self.refresh_started = time.perf_counter_ns()
         txt = self.search_var.get().strip().lower()
-        today = date.today()
-        tasks_to_show = self.tasks[:]
-
-        # filter by search text
-        if txt:
-            tasks_to_show = [t for t in tasks_to_show if txt in t["task"].lower()]
+        args = (txt, self.filter_var.get(), self.sort_var.get())
+        if self.engine.store.supports_query:
+            # indexed query; rows are fetched a page at a time as the list scrolls
+            self.query_worker.submit(self.page_view, *args)
+            self.update_selected_label()
+            return
+        cached = self.engine.cached_query(*args)
+        if cached is not None:
+            # a recently shown view with no changes since: no query, no worker round trip
+            self.query_worker.supersede()
+            self.show_results(self.engine.with_archive(cached, *args))
+        else:
+            # filter/search/sort runs on the worker thread; show_results gets the ordered tasks
+            self.query_worker.submit(self.query_view, *args)
+        self.update_selected_label()
 
-        # filter by completion
-        if self.filter_var.get() == "Completed":
-            tasks_to_show = [t for t in tasks_to_show if t["completed"]]
-        elif self.filter_var.get() == "Not Completed":
-            tasks_to_show = [t for t in tasks_to_show if not t["completed"]]
+    # the ordered tasks of a view; All and Completed continue into the archive
+    def query_view(self, txt, status, sort, cancelled):
+        tasks = self.engine.query(txt, status, sort, cancelled)
+        return None if tasks is None else self.engine.with_archive(tasks, txt, status, sort)
 
-        # apply sort
-        sort_type = self.sort_var.get()
-        if sort_type == "ID (Ascending)":
-            tasks_to_show.sort(key=lambda x: x["id"])
-        elif sort_type == "ID (Descending)":
-            tasks_to_show.sort(key=lambda x: x["id"], reverse=True)
-        elif sort_type == "Alphabetical (A-Z)":
-            tasks_to_show.sort(key=lambda x: x["task"].lower())
-        elif sort_type == "Alphabetical (Z-A)":
-            tasks_to_show.sort(key=lambda x: x["task"].lower(), reverse=True)
-        elif sort_type == "Completed First":
-            tasks_to_show.sort(key=lambda x: (not x["completed"], x["id"]))
-        elif sort_type == "Not Completed First":
-            tasks_to_show.sort(key=lambda x: (x["completed"], x["id"]))
-        elif sort_type == "Due Date (Sooner First)":
-            tasks_to_show.sort(key=lambda x: self.parse_date(x.get("due_date")))
-        elif sort_type == "Due Date (Latest First)":
-            tasks_to_show.sort(key=lambda x: self.parse_date(x.get("due_date")), reverse=True)
+    # the paged view of a database-backed store. The query reads the database, so edits still
+    # waiting for the background writer go out first - here on the worker thread, not the Tk one
+    def page_view(self, txt, status, sort, cancelled):
+        try:
+            self.engine.flush()
+        except Exception:
+            pass  # the write stays pending and the writer's retry reports it; its rows show up once written
+        if cancelled():
+            return None
+        return self.engine.with_archive(QueryPage(self.engine.store, self.engine.model.get, txt, status, sort), txt, status, sort)
+
+    def show_results(self, tasks_to_show):
+        with instrument.span("refresh.build"):
+            self.task_list.set_items(tasks_to_show)
+        if self.refresh_started is not None:
+            instrument.record("refresh.total", self.refresh_started, time.perf_counter_ns())
+            self.refresh_started = None
+            self.update_overlay()
+        if self.loaded and "first paint" not in self.startup_times:
+            self.startup_times["first paint"] = None
+            self.after_idle(self.first_paint)
+
+    def query_failed(self, error):
+        self.refresh_started = None
+        messagebox.showerror("Search Failed", f"Could not update the task list:\n{error}")
+
+    # debounce the live search: refresh once typing pauses instead of on every key
+    def schedule_search(self):
+        if self.search_job is not None:
+            self.after_cancel(self.search_job)
+        self.search_job = self.after(SEARCH_DELAY_MS, self.run_search)
+
+    def run_search(self):
+        self.search_job = None
+        self.refresh_list()
 
+    # fill one pooled row widget for a task (status colors, label text, selection highlight)
+    def fill_row(self, row, task):
+        today = date.today().toordinal()
         # determine default text color depending on appearance mode
         appearance = ctk.get_appearance_mode()  # "dark" or "light"
         default_text_color = "white" if appearance == "dark" else "black"
 
-        # show rows
-        for task in tasks_to_show:
-            row_frame = ctk.CTkFrame(self.task_list, corner_radius=8, fg_color=None)
-            row_frame.pack(fill="x", pady=6, padx=6)
-
-            # determine background color based on status
-            due = task.get("due_date", "No due date")
-            row_bg = None
-            try:
-                if due != "No due date":
-                    due_date_obj = datetime.strptime(due, "%Y-%m-%d").date()
-                    if not task["completed"] and due_date_obj < today:
-                        row_bg = self.ROW_BG["overdue"]
-                    elif not task["completed"] and due_date_obj == today:
-                        row_bg = self.ROW_BG["today"]
-                if task["completed"]:
-                    row_bg = self.ROW_BG["completed"]
-            except Exception:
-                row_bg = self.ROW_BG["normal"]
-
-            # left: summary label
-            status = "✅" if task["completed"] else "❌"
-            overdue_flag = ""
-            try:
-                if due != "No due date":
-                    dd = datetime.strptime(due, "%Y-%m-%d").date()
-                    if not task["completed"] and dd < today:
-                        overdue_flag = "⚠️ OVERDUE"
-                    elif not task["completed"] and dd == today:
-                        overdue_flag = "🔶 DUE TODAY"
-            except Exception:
-                pass
-
-            label_text = f"ID {task['id']} | {task['task']} [{status}] - Due: {due} {overdue_flag}"
-
-            # create label with default readable color
-            lbl = ctk.CTkLabel(row_frame, text=label_text, anchor="w", font=("Arial", 13), wraplength=1000, text_color=default_text_color)
-            lbl.pack(side="left", fill="x", expand=True, padx=10, pady=8)
-
-            # small action buttons on right for quick update/delete/toggle
-            btn_frame = ctk.CTkFrame(row_frame, fg_color=None)
-            btn_frame.pack(side="right", padx=8)
-
-            quick_update = ctk.CTkButton(btn_frame, text="✏️", width=48, height=36, command=lambda t=task: self.open_update_dialog(t))
-            quick_update.grid(row=0, column=0, padx=4)
-            quick_toggle = ctk.CTkButton(btn_frame, text="🔄", width=48, height=36, command=lambda t=task: self.open_toggle_dialog(t))
-            quick_toggle.grid(row=0, column=1, padx=4)
-            quick_delete = ctk.CTkButton(btn_frame, text="🗑️", width=48, height=36, command=lambda t=task: self.open_delete_dialog(t))
-            quick_delete.grid(row=0, column=2, padx=4)
-
-            # apply status background if any (non-selected)
-            try:
-                if row_bg:
-                    row_frame.configure(fg_color=row_bg)
-                else:
-                    row_frame.configure(fg_color=None)
-            except Exception:
-                pass
-
-            # if this task is selected, override background and text color for readability
-            if self.selected_task_id == task["id"]:
-                try:
-                    # choose a selection background that contrasts with mode
-                    if appearance == "dark":
-                        sel_bg = "#cfe8ff"  # light blue
-                        sel_text = "black"
-                    else:
-                        sel_bg = "#2f74c0"  # darker blue for light mode
-                        sel_text = "white"
-                    row_frame.configure(fg_color=sel_bg)
-                    lbl.configure(text_color=sel_text)
-                except Exception:
-                    pass
+        # determine background color and flag based on status
+        due = task.get("due_date", "No due date")
+        row_bg = self.ROW_BG["normal"]
+        overdue_flag = ""
+        due_ord = task.due_ord  # parsed once when the due date is set, not per row
+        if task["completed"]:
+            row_bg = self.ROW_BG["completed"]
+        elif due_ord < today:
+            row_bg = self.ROW_BG["overdue"]
+            overdue_flag = "⚠️ OVERDUE"
+        elif due_ord == today:
+            row_bg = self.ROW_BG["today"]
+            overdue_flag = "🔶 DUE TODAY"
+
+        # left: summary label (rows have a fixed height, so long titles are cut short)
+        status = "✅" if task["completed"] else "❌"
+        title = task["task"] if len(task["task"]) <= 120 else task["task"][:119] + "…"
+        if self.loaded and task["id"] not in self.engine.model:
+            overdue_flag = "📦 ARCHIVED"
+        row.label.configure(text=f"ID {task['id']} | {title} [{status}] - Due: {due} {overdue_flag}")
+
+        # if this task is selected, override background and text color for readability
+        if task["id"] in self.selected_ids:
+            # choose a selection background that contrasts with mode
+            if appearance == "dark":
+                sel_bg, sel_text = "#cfe8ff", "black"  # light blue
             else:
-                # ensure label has default text color (non-selected)
-                lbl.configure(text_color=default_text_color)
-
-            # bind click selection on entire row (toggle on second click)
-            row_frame.bind("<Button-1>", lambda e, t=task: self.select_row(t))
-            lbl.bind("<Button-1>", lambda e, t=task: self.select_row(t))
-
-        # update selected label
-        self.update_selected_label()
+                sel_bg, sel_text = "#2f74c0", "white"  # darker blue for light mode
+            row.frame.configure(fg_color=sel_bg)
+            row.label.configure(text_color=sel_text)
+        else:
+            # apply status background if any (non-selected)
+            row.frame.configure(fg_color=row_bg or row.default_bg)
+            row.label.configure(text_color=default_text_color)
 
     # selection helpers (TOGGLE behavior implemented)
-    def select_row(self, task):
-        # toggle selection: if clicked again, unselect
-        if self.selected_task_id == task["id"]:
-            self.selected_task_id = None
+    def select_row(self, row, mode="single"):
+        if not self.loaded:
+            return
+        previous = self.selected_ids
+        items = self.task_list.items
+        if mode == "range" and self.anchor_index is not None and self.anchor_index < len(items):
+            lo, hi = sorted((self.anchor_index, row.index))
+            self.selected_ids = {t["id"] for t in map(items.__getitem__, range(lo, hi + 1)) if t is not None}
         else:
-            self.selected_task_id = task["id"]
-        # refresh to update visuals
-        self.refresh_list()
+            task_id = row.task["id"]
+            if mode == "toggle":
+                self.selected_ids = previous ^ {task_id}
+            else:
+                # toggle selection: if clicked again, unselect
+                self.selected_ids = set() if previous == {task_id} else {task_id}
+            self.anchor_index = row.index
+        self.selection_changed(previous)
+
+    # every task in the current search/filter
+    def select_all(self):
+        if not self.loaded:
+            return
+        items = self.task_list.items
+        previous = self.selected_ids
+        self.selected_ids = set(items.all_ids()) if hasattr(items, "all_ids") else {t.id for t in items}
+        self.selection_changed(previous)
+
+    def clear_selection(self):
+        previous = self.selected_ids
+        self.selected_ids = set()
+        self.anchor_index = None
+        self.selection_changed(previous)
+
+    # recolor only the visible rows whose selection state flipped
+    def selection_changed(self, previous):
+        flipped = previous ^ self.selected_ids
+        if flipped:
+            self.task_list.update_where(lambda t: t.id in flipped)
+        self.update_selected_label()
 
     def update_selected_label(self):
-        if self.selected_task_id is None:
+        # drop tasks deleted meanwhile (here or by another instance)
+        by_id = self.engine.model.by_id
+        self.selected_ids = {i for i in self.selected_ids if i in by_id}
+        if not self.selected_ids:
             self.selected_label.configure(text="Selected: None")
+        elif len(self.selected_ids) == 1:
+            t = by_id[next(iter(self.selected_ids))]
+            self.selected_label.configure(text=f"Selected: ID {t['id']} - {t['task'][:40]}")
         else:
-            t = next((x for x in self.tasks if x["id"] == self.selected_task_id), None)
-            if t:
-                self.selected_label.configure(text=f"Selected: ID {t['id']} - {t['task'][:40]}")
-            else:
-                self.selected_label.configure(text="Selected: None")
+            self.selected_label.configure(text=f"Selected: {len(self.selected_ids)} tasks")
+
+    # the one selected task for the single-task actions, or None (after telling the user why)
+    def single_selection(self):
+        if not self.selected_ids:
+            messagebox.showinfo("No Selection", "Please click a task row to select it first.")
+            return None
+        if len(self.selected_ids) > 1:
+            messagebox.showinfo("Several Tasks Selected", "Please select a single task to edit.")
+            return None
+        task = self.engine.get(next(iter(self.selected_ids)))
+        if not task:
+            messagebox.showinfo("Not Found", "Selected task not found.")
+        return task
+
+    # keyboard shortcuts stay out of the way while typing in an entry
+    @staticmethod
+    def outside_entry(event):
+        return event.widget.winfo_class() != "Entry"
 
     # quick dialog openers used by quick buttons
     def open_update_dialog(self, task):
-        UpdateTaskDialog(self, task, lambda _: (save_tasks(self.tasks), self.refresh_list()))
+        task = self.live_task(task)
+        if task:
+            UpdateTaskDialog(self, task, lambda t: (self.engine.update(t), self.task_changed(t, "edit")))
 
     def open_delete_dialog(self, task):
-        DeleteTaskDialog(self, task, lambda t: (self.tasks.remove(t), save_tasks(self.tasks), self.refresh_list()))
+        task = self.live_task(task)
+        if task:
+            DeleteTaskDialog(self, task, lambda t: (self.engine.delete(t["id"]), self.refresh_list()))
 
     def open_toggle_dialog(self, task):
-        ToggleTaskDialog(self, task, lambda t: (self._toggle(t), save_tasks(self.tasks), self.refresh_list()))
+        task = self.live_task(task)
+        if task:
+            ToggleTaskDialog(self, task, lambda t: (self.engine.toggle(t), self.task_changed(t, "toggle")))
+
+    # the working-set task for a row; an archived row is restored first
+    def live_task(self, task):
+        if not self.loaded:
+            return None
+        live = self.engine.get(task["id"])
+        if live is None:
+            restored = self.engine.unarchive([task["id"]])
+            if not restored:
+                return None
+            live = restored[0]
+            self.refresh_list()
+        return live
 
     # standard footer actions operate on selected task (no ID typing)
     def update_task(self):
-        if self.selected_task_id is None:
-            messagebox.showinfo("No Selection", "Please click a task row to select it first.")
-            return
-        task = next((t for t in self.tasks if t["id"] == self.selected_task_id), None)
-        if not task:
-            messagebox.showinfo("Not Found", "Selected task not found.")
-            return
-        UpdateTaskDialog(self, task, lambda _: (save_tasks(self.tasks), self.refresh_list()))
+        task = self.single_selection()
+        if task:
+            UpdateTaskDialog(self, task, lambda t: (self.engine.update(t), self.task_changed(t, "edit")))
 
     def delete_task(self):
-        if self.selected_task_id is None:
-            messagebox.showinfo("No Selection", "Please click a task row to select it first.")
-            return
-        task = next((t for t in self.tasks if t["id"] == self.selected_task_id), None)
-        if not task:
-            messagebox.showinfo("Not Found", "Selected task not found.")
+        if len(self.selected_ids) > 1:
+            self.bulk_delete()
             return
-        DeleteTaskDialog(self, task, lambda t: (self.tasks.remove(t), save_tasks(self.tasks), self.refresh_list(), self.clear_selection()))
+        task = self.single_selection()
+        if task:
+            DeleteTaskDialog(self, task, lambda t: (self.engine.delete(t["id"]), self.refresh_list(), self.clear_selection()))
 
     def toggle_completion(self):
-        if self.selected_task_id is None:
-            messagebox.showinfo("No Selection", "Please click a task row to select it first.")
+        if len(self.selected_ids) > 1:
+            # complete them all, or reopen them all if they are all completed already
+            self.bulk_set_completed(not all(t["completed"] for t in map(self.engine.get, self.selected_ids) if t))
             return
-        task = next((t for t in self.tasks if t["id"] == self.selected_task_id), None)
-        if not task:
-            messagebox.showinfo("Not Found", "Selected task not found.")
+        task = self.single_selection()
+        if task:
+            ToggleTaskDialog(self, task, lambda t: (self.engine.toggle(t), self.task_changed(t, "toggle")))
+
+    # --- Bulk actions on the selection ---
+    def has_selection(self):
+        if not self.loaded:
+            return False
+        self.update_selected_label()
+        if not self.selected_ids:
+            messagebox.showinfo("No Selection", "Select tasks first (click, Ctrl+click, Shift+click or Select All).")
+            return False
+        return True
+
+    def bulk_set_completed(self, completed):
+        if self.has_selection():
+            self.tasks_changed(self.engine.set_completed_many(self.selected_ids, completed), "toggle")
+
+    def bulk_reschedule(self):
+        if self.has_selection():
+            CalendarPopup(self, lambda d: self.tasks_changed(self.engine.reschedule_many(self.selected_ids, d), "reschedule"),
+                          day_counts=self.engine.day_counts)
+
+    def bulk_delete(self):
+        if not self.has_selection():
             return
-        ToggleTaskDialog(self, task, lambda t: (self._toggle(t), save_tasks(self.tasks), self.refresh_list()))
+        n = len(self.selected_ids)
+        if not messagebox.askyesno("Delete Tasks", f"Delete {n} selected task{'s' if n > 1 else ''}?"):
+            return
+        deleted = {t.id for t in self.engine.delete_many(self.selected_ids)}
+        items = self.task_list.items
+        if isinstance(items, list):
+            # drop the rows in place instead of re-running the query
+            self.task_list.set_items([t for t in items if t.id not in deleted])
+        else:
+            self.refresh_list()
+        self.clear_selection()
 
-    def _toggle(self, task):
-        task["completed"] = not task["completed"]
+    # after tasks changed: update their rows in place unless the change can move them
+    # in (or out of) the current search/filter/sort, in which case the view is re-queried once
+    def tasks_changed(self, tasks, change):
+        if not tasks:
+            return
+        sort_type = self.sort_var.get()
+        if change == "toggle":
+            moves = self.filter_var.get() != "All" or sort_type in ("Completed First", "Not Completed First")
+        elif change == "reschedule":
+            moves = sort_type.startswith("Due Date")
+        else:
+            moves = bool(self.search_var.get().strip()) or sort_type.startswith(("Alphabetical", "Due Date"))
+        if moves:
+            self.refresh_list()
+        else:
+            ids = {t.id for t in tasks}
+            self.task_list.update_where(lambda t: t.id in ids)
+            self.update_selected_label()
 
-    def clear_selection(self):
-        self.selected_task_id = None
-        self.refresh_list()
+    def task_changed(self, task, change):
+        self.tasks_changed([task], change)
 
     # Add task
     def add_task(self):
@@ -538,81 +1101,147 @@ class TaskManagerApp(ctk.CTk):
         except Exception:
             messagebox.showwarning("Invalid Date", "Please select a valid due date.")
             return
-        task = {"id": generate_task_id(self.tasks), "task": new_task, "completed": False, "due_date": due_date}
-        self.tasks.append(task)
-        save_tasks(self.tasks)
+        self.engine.add(new_task, due_date)
         self.task_entry.delete(0, "end")
         self.due_date_var.set(datetime.today().strftime("%Y-%m-%d"))
         self.refresh_list()
 
     # Import/Export implementations
+    # tasks to export: the whole list (archived tasks are read page by page as they are
+    # written), or the rows of the current search/filter/sort
+    def export_snapshot(self):
+        # the view as shown (a paged view reads its rows on the export thread)
+        if self.export_view_var.get():
+            return self.task_list.items
+        return self.engine.with_archive(list(self.engine.model))
+
     def export_csv(self):
-        path = filedialog.asksaveasfilename(defaultextension=".csv", filetypes=[("CSV files","*.csv")], title="Export tasks to CSV")
+        path = filedialog.asksaveasfilename(defaultextension=".csv", filetypes=[("CSV files","*.csv"), ("Gzipped CSV files","*.csv.gz")], title="Export tasks to CSV")
         if not path:
             return
-        try:
-            with open(path, "w", newline="", encoding="utf-8") as f:
-                writer = csv.writer(f)
-                writer.writerow(["id","task","completed","due_date"])
-                for t in self.tasks:
-                    writer.writerow([t["id"], t["task"], t["completed"], t.get("due_date","No due date")])
-            messagebox.showinfo("Exported", f"Tasks exported to CSV:\n{path}")
-        except Exception as e:
-            messagebox.showerror("Export Failed", str(e))
+        self.run_export(path, "CSV")
 
     def export_excel(self):
-        if not PANDAS_AVAILABLE:
+        if not OPENPYXL_AVAILABLE:
             # fall back: export CSV and inform user
-            res = messagebox.askyesno("Pandas not installed", "Pandas/openpyxl are required for Excel export. Export CSV instead?")
+            res = messagebox.askyesno("openpyxl not installed", "openpyxl is required for Excel export. Export CSV instead?")
             if res:
                 self.export_csv()
             return
         path = filedialog.asksaveasfilename(defaultextension=".xlsx", filetypes=[("Excel files","*.xlsx")], title="Export tasks to Excel")
         if not path:
             return
-        try:
-            df = pd.DataFrame(self.tasks)
-            # ensure columns order
-            df = df[["id","task","completed","due_date"]]
-            df.to_excel(path, index=False)
-            messagebox.showinfo("Exported", f"Tasks exported to Excel:\n{path}")
-        except Exception as e:
-            messagebox.showerror("Export Failed", str(e))
+        self.run_export(path, "Excel")
+
+    def run_export(self, path, kind):
+        job = TaskExport(self.export_snapshot(), path)
+        dialog = ProgressDialog(self, f"⬆️ Exporting {kind}", job.cancel)
+        job.start()
+        self.after(QUERY_POLL_MS, lambda: self.poll_export(job, dialog, kind))
+
+    def poll_export(self, job, dialog, kind):
+        if not job.finished:
+            dialog.update_progress(job.progress, f"Exported {job.written} of {len(job.tasks)} tasks...")
+            self.after(100, lambda: self.poll_export(job, dialog, kind))
+            return
+        dialog.destroy()
+        if job.error is not None:
+            messagebox.showerror("Export Failed", str(job.error))
+        elif job.cancelled.is_set():
+            messagebox.showinfo("Export Cancelled", "Export cancelled; no file was written.")
+        else:
+            messagebox.showinfo("Exported", f"Tasks exported to {kind}:\n{job.path}")
 
+    # one or more CSV/Excel files; tasks that already exist (same text and due date) are skipped
     def import_csv(self):
-        path = filedialog.askopenfilename(filetypes=[("CSV files","*.csv")], title="Import tasks from CSV")
-        if not path:
+        types = [("CSV files", "*.csv"), ("Excel files", "*.xlsx")] if OPENPYXL_AVAILABLE else [("CSV files", "*.csv")]
+        paths = filedialog.askopenfilenames(filetypes=types, title="Import tasks from CSV")
+        if paths:
+            self.run_import(list(paths))
+
+    def import_folder(self):
+        path = filedialog.askdirectory(title="Import every CSV/Excel file in a folder")
+        if path:
+            self.run_import([path])
+
+    # a single CSV streams in batches with bounded memory; several files are parsed in parallel
+    def run_import(self, paths):
+        if len(paths) == 1 and paths[0].lower().endswith(".csv"):
+            job = CsvImport(paths[0], dedupe=True, engine=self.engine)
+        else:
+            job = BulkImport(paths, engine=self.engine)
+        if not job.paths:
+            messagebox.showinfo("Nothing to Import", "No CSV or Excel files were found.")
             return
-        try:
-            with open(path, "r", encoding="utf-8") as f:
-                reader = csv.DictReader(f)
-                added = 0
-                for row in reader:
-                    # map fields, handle missing/invalid
-                    txt = row.get("task") or row.get("Task") or ""
-                    if not txt.strip():
-                        continue
-                    comp_field = row.get("completed","False")
-                    completed = str(comp_field).strip().lower() in ("1","true","yes","y","t")
-                    due = row.get("due_date") or row.get("Due Date") or "No due date"
-                    # avoid id collisions: assign new ID
-                    task = {"id": generate_task_id(self.tasks), "task": txt.strip(), "completed": completed, "due_date": due}
-                    self.tasks.append(task)
-                    added += 1
-                save_tasks(self.tasks)
-                messagebox.showinfo("Import Complete", f"Imported {added} tasks from CSV.")
-                self.refresh_list()
-        except Exception as e:
-            messagebox.showerror("Import Failed", str(e))
+        if not OPENPYXL_AVAILABLE and any(p.lower().endswith(".xlsx") for p in job.paths):
+            messagebox.showerror("Excel Import", "Importing Excel files requires openpyxl (pip install openpyxl).")
+            return
+        dialog = ProgressDialog(self, "⬇️ Importing Tasks", job.cancel)
+        job.start()
+        self.after(QUERY_POLL_MS, lambda: self.poll_import(job, dialog))
+
+    # drain parsed batches on the Tk thread: one batch per tick keeps the window responsive
+    def poll_import(self, job, dialog):
+        if not job.cancelled.is_set():
+            added = job.apply_next(self.engine)
+            dialog.update_progress(job.progress, job.describe())
+            if not job.finished:
+                self.after(1 if added else QUERY_POLL_MS, lambda: self.poll_import(job, dialog))
+                return
+        dialog.destroy()
+        self.refresh_list()
+        if job.error is not None:
+            messagebox.showerror("Import Failed", f"{job.error}\n\n{job.imported} tasks were imported before the error.")
+            return
+        msg = f"Imported {job.imported} tasks from {len(job.paths)} file{'s' if len(job.paths) > 1 else ''}."
+        if job.cancelled.is_set():
+            msg = f"Import cancelled. {job.imported} tasks were imported."
+        if job.duplicates:
+            msg += f"\nSkipped {job.duplicates} tasks that already exist."
+        if job.skipped:
+            msg += f"\nSkipped {job.skipped} rows without task text."
+        if job.cleared_dates:
+            msg += f"\n{job.cleared_dates} unreadable due dates were set to 'No due date'."
+        messagebox.showinfo("Import Complete", msg)
 
     # Startup reminder: show tasks due today
+    # the due-date scheduler hands over whatever is due by today; after that a timer at each
+    # midnight pops the tasks that just became due and re-colors only the rows that changed
     def startup_reminder(self):
-        today = date.today()
-        due_today = [t for t in self.tasks if (t.get("due_date") and t["due_date"] != "No due date" and \
-                    (lambda d: (d == today))(datetime.strptime(t["due_date"], "%Y-%m-%d").date()) and not t["completed"])]
+        self.today = date.today().toordinal()
+        self.remind(self.engine.due.pop_due(self.today))
+        self.schedule_rollover()
+
+    def schedule_rollover(self):
+        now = datetime.now()
+        midnight = datetime.combine(now.date() + timedelta(days=1), datetime.min.time())
+        # a second past midnight, so date.today() has surely moved on
+        self.after(int((midnight - now).total_seconds() * 1000) + 1000, self.day_rollover)
+
+    def day_rollover(self):
+        today = date.today().toordinal()
+        # also covers a timer that fired late (sleep/suspend) or early (clock change)
+        if today != self.today:
+            previous, self.today = self.today, today
+            # due on the old day -> overdue, due on the new day -> due today
+            self.task_list.update_where(lambda t: previous <= t.due_ord <= today)
+            self.remind(self.engine.due.pop_due(today))
+            try:
+                if self.engine.archive_old():
+                    self.refresh_list()
+            except Exception:
+                pass  # retried at the next rollover
+        self.schedule_rollover()
+
+    # popup for the tasks that are due today (older ones were already overdue, no popup)
+    def remind(self, popped):
+        due_today = [t for t in (self.engine.get(i) for due, i in popped if due == self.today) if t]
         if due_today:
-            text = "Tasks due today:\n\n" + "\n".join([f"ID {t['id']}: {t['task']}" for t in due_today])
-            # show a non-blocking popup (messagebox is blocking, but OK at startup)
+            lines = [f"ID {t['id']}: {t['task']}" for t in due_today[:REMINDER_LINES]]
+            if len(due_today) > REMINDER_LINES:
+                lines.append(f"... and {len(due_today) - REMINDER_LINES} more")
+            text = "Tasks due today:\n\n" + "\n".join(lines)
+            # messagebox is modal, which is fine for an occasional reminder
             messagebox.showinfo("Due Today", text)
 
     def ask_for_id_old(self, title):
@@ -627,10 +1256,18 @@ class TaskManagerApp(ctk.CTk):
     def change_mode(self):
         mode = self.switch_var.get()
         ctk.set_appearance_mode(mode)
-        # re-render to make sure colors adapt
-        self.refresh_list()
+        # restyle the existing rows so colors adapt
+        self.task_list.restyle()
 
 # Run
 if __name__ == "__main__":
-    app = TaskManagerApp()
+    import argparse
+    parser = argparse.ArgumentParser(description="Advanced Task Manager")
+    parser.add_argument("--profile-startup", action="store_true", help="print import, load and first-paint times, then exit")
+    parser.add_argument("--data", default=None, help="task file (default $TODO_DATA, else tasks.json / tasks.db)")
+    parser.add_argument("--trace", default=None, help="record a Chrome trace of the session and write it here on exit")
+    args = parser.parse_args()
+    if args.trace:
+        instrument.trace_to(args.trace)
+    app = TaskManagerApp(profile_startup=args.profile_startup, data_path=args.data)
     app.mainloop()
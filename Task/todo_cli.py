@@ -0,0 +1,225 @@
+# Batch command-line front end for the task engine; runs without a display.
+#
+#   python todo_cli.py commands.txt more.jsonl    # or pipe commands on stdin
+#   echo 'add "Buy milk" 2026-01-05' | python todo_cli.py
+#
+# One command per line, either shell-style words or a JSON object with an "op" key:
+#   add <text> [due_date] [--done]      {"op": "add", "task": "Buy milk", "due_date": "2026-01-05"}
+#   complete <id>...                    {"op": "complete", "ids": [1, 2, 3]}
+#   uncomplete <id>...
+#   toggle <id>...
+#   edit <id> <text> [due_date]         {"op": "edit", "id": 4, "task": "...", "due_date": "..."}
+#   delete <id>...
+#   import <csv path>
+#   bulk-import <path>...               CSV/Excel files or directories, in parallel, skipping existing tasks
+#   archive [days]                      move completed tasks due more than N days ago to the archive
+#   unarchive <id>...
+#   query [--search TEXT] [--filter All|Completed|"Not Completed"] [--sort MODE] [--limit N]
+#
+# Commands are applied in batches of --batch-size lines with a single store write per batch.
+# Query results are printed to stdout as JSON lines (All and Completed include archived tasks,
+# after the working set); errors go to stderr and are skipped.
+#
+#   python todo_cli.py --convert binary           # rewrite tasks.json as a binary snapshot
+#   python todo_cli.py --sync http://host:8765 cmds.txt   # then sync with a task_sync.py server
+import argparse
+import itertools
+import json
+import shlex
+import sys
+
+import instrument
+from task_engine import (STORAGE_MODE, TASK_FORMAT, TASK_FILE, DATA_PATH, ARCHIVE_DAYS, TaskEngine, TaskArchive, CsvImport, BulkImport,
+                         open_store, normalize_dates, convert_tasks)
+
+ID_COMMANDS = ("complete", "uncomplete", "toggle", "delete", "unarchive")
+# the keys a JSON command must have (shell-style lines are checked while parsing)
+JSON_REQUIRED = {"add": ("task",), "edit": ("id",), "import": ("path",), "bulk-import": ("paths",),
+                 **{op: ("ids",) for op in ID_COMMANDS}}
+
+query_parser = argparse.ArgumentParser(prog="query", add_help=False, exit_on_error=False)
+query_parser.add_argument("--search", default="")
+query_parser.add_argument("--filter", default="All", choices=["All", "Completed", "Not Completed"])
+query_parser.add_argument("--sort", default="ID (Ascending)")
+query_parser.add_argument("--limit", type=int, default=None)
+
+# a command line -> (op, args dict); None for blank lines and comments
+def parse_line(line):
+    line = line.strip()
+    if not line or line.startswith("#"):
+        return None
+    if line.startswith("{"):
+        args = json.loads(line)
+        if not isinstance(args, dict) or "op" not in args:
+            raise ValueError('a JSON command needs an "op" key')
+        op = args.pop("op")
+        for key in JSON_REQUIRED.get(op, ()):
+            if key not in args:
+                hint = ' (a list of task ids, e.g. "ids": [1, 2])' if key == "ids" else ""
+                raise ValueError(f"{op} needs {key!r}{hint}")
+        if op in ID_COMMANDS and not (isinstance(args["ids"], list) and all(type(i) is int for i in args["ids"])):
+            raise ValueError(f'{op}: "ids" must be a list of task ids, e.g. "ids": [1, 2]')
+        return op, args
+    words = shlex.split(line)
+    op, rest = words[0], words[1:]
+    if op == "add":
+        done = "--done" in rest
+        rest = [w for w in rest if w != "--done"]
+        if not rest:
+            raise ValueError("add needs the task text")
+        return op, {"task": rest[0], "due_date": rest[1] if len(rest) > 1 else None, "completed": done}
+    if op in ID_COMMANDS:
+        if not rest:
+            raise ValueError(f"{op} needs at least one task id")
+        return op, {"ids": [int(w) for w in rest]}
+    if op == "edit":
+        if len(rest) < 2:
+            raise ValueError("edit needs an id and the new text")
+        return op, {"id": int(rest[0]), "task": rest[1], "due_date": rest[2] if len(rest) > 2 else None}
+    if op == "import":
+        return op, {"path": rest[0]}
+    if op == "bulk-import":
+        if not rest:
+            raise ValueError("bulk-import needs at least one file or directory")
+        return op, {"paths": rest}
+    if op == "archive":
+        return op, {"days": int(rest[0]) if rest else ARCHIVE_DAYS}
+    if op == "query":
+        try:
+            return op, vars(query_parser.parse_args(rest))
+        except SystemExit:
+            raise ValueError(f"bad query arguments: {' '.join(rest)}")
+    raise ValueError(f"unknown command {op!r}")
+
+def normalize_due(value):
+    if not value:
+        return "No due date"
+    due = normalize_dates([value])[value]
+    if due == "No due date" and value != "No due date":
+        raise ValueError(f"invalid due date {value!r}")
+    return due
+
+def get_task(engine, task_id):
+    task = engine.get(task_id)
+    if task is None:
+        raise ValueError(f"no task with id {task_id}")
+    return task
+
+def run_command(engine, op, args, out):
+    if op == "add":
+        engine.add(args["task"], normalize_due(args.get("due_date")), bool(args.get("completed")))
+    elif op in ("complete", "uncomplete", "toggle", "delete"):
+        # check every id first, so one bad id leaves the others untouched too
+        tasks = [get_task(engine, task_id) for task_id in args["ids"]]
+        if op == "toggle":
+            for task in tasks:
+                engine.toggle(task)
+        elif op == "delete":
+            engine.delete_many(args["ids"])
+        else:
+            engine.set_completed_many(args["ids"], op == "complete")
+    elif op == "edit":
+        # validate everything before touching the task, so a bad date changes nothing
+        task = get_task(engine, args["id"])
+        due = normalize_due(args["due_date"]) if args.get("due_date") else None
+        if args.get("task"):
+            task["task"] = args["task"]
+        if due is not None:
+            task["due_date"] = due
+        engine.update(task)
+    elif op in ("import", "bulk-import"):
+        job = CsvImport(args["path"]) if op == "import" else BulkImport(args["paths"])
+        job.start()
+        while not job.finished:
+            job.apply_next(engine, timeout=0.1)
+        if job.error is not None:
+            raise job.error
+        if op == "bulk-import":
+            print(f"bulk-import: {job.imported} added, {job.duplicates} already present, {job.skipped} rows without text",
+                  file=sys.stderr)
+    elif op == "archive":
+        if args.get("days") is None:
+            raise ValueError("archive needs a number of days (TODO_ARCHIVE_DAYS is off)")
+        engine.archive_old(args["days"])
+    elif op == "unarchive":
+        archived = {t.id for t in engine.archive.get_many(args["ids"])}
+        missing = [i for i in args["ids"] if i not in archived and engine.get(i) is None]
+        if missing:
+            raise ValueError(f"no archived task with id {missing[0]}")
+        engine.unarchive(args["ids"])
+    elif op == "query":
+        view = (args.get("search", ""), args.get("filter", "All"), args.get("sort", "ID (Ascending)"))
+        tasks = engine.with_archive(engine.query(*view), *view)
+        limit = len(tasks) if args.get("limit") is None else min(args["limit"], len(tasks))
+        for i in range(limit):
+            out.write(json.dumps(tasks[i].to_dict(), ensure_ascii=False) + "\n")
+    else:
+        raise ValueError(f"unknown command {op!r}")
+
+def iter_lines(paths):
+    for path in paths:
+        if path == "-":
+            for lineno, line in enumerate(sys.stdin, 1):
+                yield "<stdin>", lineno, line
+        else:
+            with open(path, "r", encoding="utf-8") as f:
+                for lineno, line in enumerate(f, 1):
+                    yield path, lineno, line
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Apply task commands in batches without starting the GUI.")
+    parser.add_argument("files", nargs="*", default=["-"], help="command files ('-' or nothing for stdin)")
+    parser.add_argument("--storage", default=STORAGE_MODE, choices=["journal", "json", "sqlite"])
+    parser.add_argument("--data", default=None, help="task file (default $TODO_DATA, else tasks.json / tasks.db)")
+    parser.add_argument("--batch-size", type=int, default=1000, help="commands per store write")
+    parser.add_argument("--format", default=TASK_FORMAT, choices=["json", "binary"], help="format for rewritten task files")
+    parser.add_argument("--convert", default=None, choices=["json", "binary"], help="convert the task file to this format and exit")
+    parser.add_argument("--stats", action="store_true", help="print timing histograms and counters to stderr at the end")
+    parser.add_argument("--trace", default=None, help="write a Chrome trace-event file of the run")
+    parser.add_argument("--sync", default=None, metavar="URL", help="sync with this server after applying the commands")
+    args = parser.parse_args(argv)
+    if args.trace:
+        instrument.start_tracing()
+
+    if args.convert:
+        count = convert_tasks(args.data or DATA_PATH or TASK_FILE, args.convert)
+        print(f"{count} tasks written as {args.convert}", file=sys.stderr)
+        return 0
+
+    store = open_store(args.storage, args.data, args.format)
+    engine = TaskEngine(store, archive=TaskArchive.for_store(store))
+    engine.load()
+    applied = errors = 0
+    lines = iter_lines(args.files)
+    try:
+        while True:
+            chunk = list(itertools.islice(lines, args.batch_size))
+            if not chunk:
+                break
+            with engine.batch():
+                for name, lineno, line in chunk:
+                    try:
+                        cmd = parse_line(line)
+                        if cmd is None:
+                            continue
+                        run_command(engine, *cmd, sys.stdout)
+                        applied += 1
+                    except Exception as e:
+                        errors += 1
+                        print(f"{name}:{lineno}: {e}", file=sys.stderr)
+        if args.sync:
+            from task_sync import SyncClient
+            changed, removed, pushed = SyncClient.for_store(args.sync, store).sync(engine)
+            print(f"sync: pulled {len(changed)} changed and {len(removed)} deleted tasks, pushed {pushed} changes",
+                  file=sys.stderr)
+    finally:
+        engine.close()
+    print(f"{applied} commands applied, {errors} errors", file=sys.stderr)
+    if args.stats:
+        print(instrument.report(), file=sys.stderr)
+    if args.trace:
+        instrument.dump_trace(args.trace)
+    return 1 if errors else 0
+
+if __name__ == "__main__":
+    sys.exit(main())